@@ -1,22 +1,29 @@
 # app/streamlit_app.py
 import streamlit as st
-import ee
-import numpy as np
-import cv2
-from datetime import datetime, timedelta
-from io import BytesIO
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import requests
-import sys
-import os
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from streamlit_folium import st_folium
 import folium
 import google.generativeai as genai
+import sys
+import os
+
+# Add repo root to path so backend/ is importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.dates import format_date
+
+@st.cache_resource
+def get_gemini_model():
+    """Configure Gemini once per server process and return the model."""
+    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
+    return genai.GenerativeModel('gemini-2.0-flash')
 
 # Configure Gemini AI
 try:
-    genai.configure(api_key=st.secrets["GOOGLE_API_KEY"])
-        model = genai.GenerativeModel('gemini-2.0-flash')
+    model = get_gemini_model()
 except Exception as e:
     st.error(f"Gemini configuration error: {e}")
 
@@ -44,16 +51,129 @@ def mask_s2_clouds(image):
     mask = scl.neq(3).And(scl.neq(8)).And(scl.neq(9)).And(scl.neq(10))
     return image.updateMask(mask)
 
-# Initialize Earth Engine
-try:
+def get_http_session():
+    """HTTP session with keep-alive connection pooling plus 5xx retries.
+
+    Kept per user session in st.session_state rather than shared through
+    st.cache_resource, since requests.Session isn't guaranteed thread-safe.
+    """
+    if "http_session" not in st.session_state:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504])
+        )
+        session.mount("https://", adapter)
+        st.session_state["http_session"] = session
+    return st.session_state["http_session"]
+
+@st.cache_resource
+def init_ee():
+    """Initialize Earth Engine once per server process and return the credentials.
+
+    st.secrets is only read on the first call; later reruns get the cached
+    credentials without touching secrets or re-running ee.Initialize().
+    """
+    # Deferred: the ee client is slow to import and only needed once a run starts
+    import ee
+    ee_secrets = st.secrets["ee_service_account"]
     credentials = ee.ServiceAccountCredentials(
-        email=st.secrets["ee_service_account"]["client_email"],
-        key_data=st.secrets["ee_service_account"]["ee_private_key"]
+        email=ee_secrets["client_email"],
+        key_data=ee_secrets["ee_private_key"]
     )
     ee.Initialize(credentials)
-except Exception as e:
-    st.error(f"Failed to initialize Earth Engine: {e}")
-    sys.exit(1)
+    return credentials
+
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def fetch_change_analysis(lat, lon, size_km, months_back, threshold):
+    """Run the Earth Engine change analysis and return plain, cacheable results.
+
+    Identical parameters within the TTL are served from cache instead of
+    re-running the Earth Engine round-trips. Returns None when fewer than two
+    cloud-free images are available.
+    """
+    import ee
+    point = ee.Geometry.Point([lon, lat])
+    region = point.buffer(size_km * 1000 / 2).bounds()
+    
+    end_date = datetime.now(timezone.utc)
+    start_date = end_date - timedelta(days=months_back * 30)
+    
+    # Using Sentinel-2 Surface Reflectance
+    collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
+        .filterBounds(region) \
+        .filterDate(format_date(start_date), format_date(end_date)) \
+        .map(mask_s2_clouds)
+    
+    if collection.size().getInfo() < 2:
+        return None
+    
+    recent = collection.sort('system:time_start', False).first()
+    old = collection.sort('system:time_start').first()
+    
+    # Use NDVI for more robust change detection (vegetation/construction)
+    def get_ndvi(img):
+        return img.normalizedDifference(['B8', 'B4']).rename('NDVI')
+    
+    recent_ndvi = get_ndvi(recent)
+    old_ndvi = get_ndvi(old)
+    
+    # Detect change in NDVI
+    diff = recent_ndvi.subtract(old_ndvi).abs()
+    change_mask = diff.gt(threshold)
+    
+    # Morphological cleanup on the EE side, same as backend/process_change.py:
+    # 3x3 open + close == erode(3x3) -> dilate(5x5) -> erode(3x3).
+    # Pixel-unit focal ops would otherwise run at each request's scale (10 m for
+    # reduceRegion, ~40-100 m for the 512 px thumbnail); pinning the mask to the
+    # native 10 m grid first makes the preview and the counted mask identical.
+    change_mask = change_mask \
+        .reproject(crs=recent.select('B4').projection(), scale=10) \
+        .focal_min(radius=1, kernelType='square', units='pixels') \
+        .focal_max(radius=2, kernelType='square', units='pixels') \
+        .focal_min(radius=1, kernelType='square', units='pixels')
+    
+    # Stats and both scene dates come back in a single getInfo() request;
+    # it and the thumbnail URL requests are independent, so issue them
+    # concurrently instead of one after another.
+    info = ee.Dictionary({
+        'stats': change_mask.reduceRegion(
+            reducer=ee.Reducer.sum(),
+            geometry=region,
+            scale=10,
+            maxPixels=1e9
+        ),
+        'total_pixels': region.area(maxError=1).divide(100),
+        'old_time': old.get('system:time_start'),
+        'recent_time': recent.get('system:time_start'),
+    })
+    thumb_params = {'region': region, 'dimensions': 512, 'format': 'png'}
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        info_future = pool.submit(info.getInfo)
+        old_url_future = pool.submit(
+            old.select(['B4', 'B3', 'B2']).visualize(min=0, max=3000).getThumbURL, thumb_params)
+        recent_url_future = pool.submit(
+            recent.select(['B4', 'B3', 'B2']).visualize(min=0, max=3000).getThumbURL, thumb_params)
+        change_url_future = pool.submit(
+            change_mask.visualize(min=0, max=1, palette=['black', 'red']).getThumbURL, thumb_params)
+    
+    info = info_future.result()
+    change_pixels = info['stats'].get('NDVI', 0)
+    total_pixels = info['total_pixels']
+    change_pct = (change_pixels / total_pixels) * 100 if total_pixels > 0 else 0
+    total_area_km2 = float(size_km)**2
+    changed_area_km2 = (change_pct / 100.0) * total_area_km2
+    
+    return {
+        "change_pct": change_pct,
+        "changed_area_km2": changed_area_km2,
+        "old_url": old_url_future.result(),
+        "old_date": format_date(datetime.fromtimestamp(info['old_time']/1000, timezone.utc)),
+        "recent_url": recent_url_future.result(),
+        "recent_date": format_date(datetime.fromtimestamp(info['recent_time']/1000, timezone.utc)),
+        "change_url": change_url_future.result(),
+    }
 
 st.title("Satellite Conflict Monitor")
 st.write("Detect landscape changes using Sentinel-2 satellite imagery")
@@ -77,7 +197,7 @@ with tab1:
     if location_search:
         try:
             geocode_url = f"https://nominatim.openstreetmap.org/search?q={location_search}&format=json&limit=1"
-            response = requests.get(geocode_url, headers={"User-Agent": "SatelliteConflictMonitor/1.0"})
+            response = get_http_session().get(geocode_url, headers={"User-Agent": "SatelliteConflictMonitor/1.0"}, timeout=10)
             if response.status_code == 200:
                 results = response.json()
                 if results:
@@ -109,80 +229,39 @@ with col5:
     threshold = st.slider("Sensitivity", min_value=0.05, max_value=0.5, value=0.15, step=0.01)
 
 if st.button("Analyze Changes"):
+    try:
+        init_ee()
+    except Exception as e:
+        st.error(f"Failed to initialize Earth Engine: {e}")
+        st.stop()
+
     with st.spinner("Processing satellite imagery..."):
         try:
-            point = ee.Geometry.Point([lon, lat])
-            region = point.buffer(size_km * 1000 / 2).bounds()
-            
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=months_back * 30)
+            result = fetch_change_analysis(round(lat, 4), round(lon, 4), size_km, months_back, threshold)
             
-            # Using Sentinel-2 Surface Reflectance
-            collection = ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED') \
-                .filterBounds(region) \
-                .filterDate(start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')) \
-                .map(mask_s2_clouds)
-            
-            if collection.size().getInfo() < 2:
+            if result is None:
                 st.error("Not enough cloud-free images available.")
             else:
-                recent = collection.sort('system:time_start', False).first()
-                old = collection.sort('system:time_start').first()
-                
-                # Use NDVI for more robust change detection (vegetation/construction)
-                def get_ndvi(img):
-                    return img.normalizedDifference(['B8', 'B4']).rename('NDVI')
-                
-                recent_ndvi = get_ndvi(recent)
-                old_ndvi = get_ndvi(old)
-                
-                # Detect change in NDVI
-                diff = recent_ndvi.subtract(old_ndvi).abs()
-                change_mask = diff.gt(threshold)
-                
-                # Stats
-                stats = change_mask.reduceRegion(
-                    reducer=ee.Reducer.sum(),
-                    geometry=region,
-                    scale=10,
-                    maxPixels=1e9
-                ).getInfo()
-                
-                change_pixels = stats.get('NDVI', 0)
-                total_pixels = region.area(maxError=1).divide(100).getInfo()
-                change_pct = (change_pixels / total_pixels) * 100 if total_pixels > 0 else 0
-                total_area_km2 = float(size_km)**2
-                changed_area_km2 = (change_pct / 100.0) * total_area_km2
-                
                 st.success("Analysis Complete!")
                 
                 col_a, col_b = st.columns(2)
                 with col_a:
                     st.subheader("Older Image (RGB)")
-                    old_url = old.select(['B4', 'B3', 'B2']).visualize(min=0, max=3000).getThumbURL({
-                        'region': region, 'dimensions': 512, 'format': 'png'
-                    })
-                    st.image(old_url)
-                    st.caption(f"Date: {datetime.fromtimestamp(old.get('system:time_start').getInfo()/1000).strftime('%Y-%m-%d')}")
+                    st.image(result["old_url"])
+                    st.caption(f"Date: {result['old_date']}")
                 
                 with col_b:
                     st.subheader("Recent Image (RGB)")
-                    recent_url = recent.select(['B4', 'B3', 'B2']).visualize(min=0, max=3000).getThumbURL({
-                        'region': region, 'dimensions': 512, 'format': 'png'
-                    })
-                    st.image(recent_url)
-                    st.caption(f"Date: {datetime.fromtimestamp(recent.get('system:time_start').getInfo()/1000).strftime('%Y-%m-%d')}")
+                    st.image(result["recent_url"])
+                    st.caption(f"Date: {result['recent_date']}")
                 
                 st.subheader("Detected Changes (NDVI Difference)")
-                change_viz_url = change_mask.visualize(min=0, max=1, palette=['black', 'red']).getThumbURL({
-                    'region': region, 'dimensions': 512, 'format': 'png'
-                })
-                st.image(change_viz_url)
+                st.image(result["change_url"])
                 
                 st.subheader("AI Contextual Analysis")
                 loc_name = location_search if location_search else f"Coordinates ({lat}, {lon})"
                 with st.spinner("Generating AI Analysis..."):
-                    ai_report = get_ai_analysis(change_pct, changed_area_km2, loc_name)
+                    ai_report = get_ai_analysis(result["change_pct"], result["changed_area_km2"], loc_name)
                     st.markdown(ai_report)
                     
         except Exception as e:
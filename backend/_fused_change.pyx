@@ -0,0 +1,34 @@
+# backend/_fused_change.pyx
+# cython: language_level=3
+# Cython kernel for the diff + threshold stage of process_change.py
+# (engine="cython"). Build it into backend/ with:
+#   python backend/build_fused_change.py
+
+cimport cython
+from cython.parallel cimport prange
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cpdef void fused_change_u8(const unsigned char[:, ::1] before,
+                           const unsigned char[:, ::1] after,
+                           int thresh,
+                           unsigned char[:, ::1] diff,
+                           unsigned char[:, ::1] mask):
+    """absdiff + binary threshold of two uint8 images in one pass.
+
+    diff and mask are caller-supplied buffers of the same shape, so nothing
+    is allocated here. Rows are split across OpenMP threads. Changed pixels
+    are counted by the caller after morphological cleanup.
+    """
+    cdef Py_ssize_t h = before.shape[0]
+    cdef Py_ssize_t w = before.shape[1]
+    cdef Py_ssize_t i, j
+    cdef int d
+    for i in prange(h, nogil=True):
+        for j in range(w):
+            d = <int>after[i, j] - <int>before[i, j]
+            if d < 0:
+                d = -d
+            diff[i, j] = <unsigned char>d
+            mask[i, j] = 255 if d > thresh else 0
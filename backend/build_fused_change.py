@@ -0,0 +1,34 @@
+# backend/build_fused_change.py
+# Builds the optional Cython kernel used by process_change.py (engine="cython")
+# into backend/. The app itself needs no build step.
+# Linux/gcc only: the -march=native -fopenmp flags fail on macOS clang.
+#   pip install cython
+#   python backend/build_fused_change.py
+
+import os
+import sys
+
+from setuptools import setup, Extension
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+if __name__ == "__main__":
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        sys.exit("Cython is required to build the kernel: pip install cython")
+
+    # Build relative to the repo root so the module lands at backend/_fused_change*.so
+    os.chdir(ROOT)
+    ext = Extension(
+        "backend._fused_change",
+        ["backend/_fused_change.pyx"],
+        extra_compile_args=["-O3", "-march=native", "-fopenmp"],
+        extra_link_args=["-fopenmp"],
+    )
+    setup(
+        name="fused-change",
+        ext_modules=cythonize([ext]),
+        script_args=["build_ext", "--inplace"],
+    )
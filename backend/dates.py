@@ -0,0 +1,7 @@
+# backend/dates.py
+# Date helpers shared by the Streamlit app and gee_fetch.py.
+
+
+def format_date(d):
+    """Format a date as YYYY-MM-DD (f-string, cheaper than strftime)."""
+    return f"{d.year:04d}-{d.month:02d}-{d.day:02d}"
@@ -3,13 +3,15 @@
 # Used by the Streamlit app to get Sentinel-2 composites for any AOI.
 
 import ee
-from datetime import datetime, timedelta
+import functools
+from datetime import datetime, timedelta, timezone
 import sys
 import os
 
 # Add parent dir to path so config.py is importable
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import CLOUD_THRESHOLD
+from backend.dates import format_date
 
 
 def initialize_ee():
@@ -27,7 +29,16 @@ def km_to_deg(km):
 
 
 def get_bbox(lat, lon, size_km):
-    """Return an ee.Geometry.Rectangle for a given center + size."""
+    """Return an ee.Geometry.Rectangle for a given center + size.
+
+    Centers are rounded to 4 decimals (~11 m) and geometries are cached,
+    so repeat calls for the same AOI reuse one ee.Geometry object.
+    """
+    return _cached_bbox(round(lat, 4), round(lon, 4), size_km)
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_bbox(lat, lon, size_km):
     d = km_to_deg(size_km) / 2
     return ee.Geometry.Rectangle([lon - d, lat - d, lon + d, lat + d])
 
@@ -62,11 +73,11 @@ def get_before_after_composites(lat, lon, size_km, days_back=365, cloud_pct=None
 
     aoi = get_bbox(lat, lon, size_km)
 
-    end   = datetime.utcnow()
+    end   = datetime.now(timezone.utc)
     start = end - timedelta(days=days_back)
 
-    start_str = start.strftime("%Y-%m-%d")
-    end_str   = end.strftime("%Y-%m-%d")
+    start_str = format_date(start)
+    end_str   = format_date(end)
 
     col = get_s2_collection(aoi, start_str, end_str, cloud_pct)
 
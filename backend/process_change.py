@@ -4,65 +4,250 @@
 
 import cv2
 import numpy as np
-import rasterio
 from pathlib import Path
+import functools
 import json
 import sys
 import os
-from io import BytesIO
-import requests
-from PIL import Image
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import CHANGE_THRESHOLD
+from config import CHANGE_THRESHOLD, USE_OPENCL
+
+# Structuring elements for mask cleanup, built once at import.
+# Open then close with a 3x3 square is erode -> dilate -> dilate -> erode;
+# the two middle dilations collapse into a single 5x5 dilation.
+# OpenCV already runs MORPH_RECT kernels as separate row/column passes
+# internally, so explicit 1-D kernels would only add extra calls.
+KERNEL_3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+KERNEL_5 = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+
+# Output thumbnail size (width, height)
+THUMB_SIZE = (512, 512)
+
+
+@functools.lru_cache(maxsize=None)
+def _opencl_enabled():
+    """Enable OpenCV's OpenCL (T-API) backend if the default device is an iGPU.
+
+    Probed once, on the first opencv-engine call rather than at import, since
+    setting up an OpenCL context is slow and changes process-wide OpenCV
+    state. Discrete GPUs are skipped: for morphology on images this size the
+    host<->device transfers cost more than the GPU saves. Set USE_OPENCL =
+    False in config.py to always stay on the CPU.
+    """
+    if not USE_OPENCL or not cv2.ocl.haveOpenCL():
+        return False
+    # type() is the raw CL_DEVICE_TYPE bitfield (Device_TYPE_IGPU is only a
+    # selector flag no device reports); an integrated GPU is a GPU that
+    # shares host memory, the same test OpenCV uses internally
+    dev = cv2.ocl.Device.getDefault()
+    if not (dev.type() & cv2.ocl.Device_TYPE_GPU and dev.hostUnifiedMemory()):
+        return False
+    cv2.ocl.setUseOpenCL(True)
+    return True
+
+
+# dtypes OpenCV's numpy bridge takes as-is; others (uint32, int64, bool,
+# float16, ...) are rejected or silently narrowed, so they go via float32
+CV_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.int32, np.float32, np.float64)
+
+
+def as_cv_array(arr):
+    """Return arr, or a float32 copy if OpenCV can't take its dtype."""
+    if arr.dtype.type not in CV_DTYPES:
+        return arr.astype("float32")
+    return arr
 
 
 def normalize_array(arr):
-    """Normalize a float32 array to uint8 (0-255)."""
-    return cv2.normalize(arr, None, 0, 255, cv2.NORM_MINMAX).astype("uint8")
+    """Normalize an array to uint8 (0-255), rounding to nearest."""
+    arr = as_cv_array(arr)
+    mn, mx, _, _ = cv2.minMaxLoc(arr)
+    if mx == mn:
+        return np.zeros(arr.shape, np.uint8)
+    # Already full-range uint8: normalization would be a no-op
+    if arr.dtype == np.uint8 and mn == 0 and mx == 255:
+        return arr
+    # Scale + offset + uint8 cast in a single convertScaleAbs pass
+    alpha = 255.0 / (mx - mn)
+    beta  = -mn * alpha
+    return cv2.convertScaleAbs(arr, alpha=alpha, beta=beta)
+
 
+# dtypes cv2.resize(..., INTER_AREA) accepts as-is
+RESIZE_DTYPES = (np.uint8, np.uint16, np.int16, np.float32, np.float64)
 
-def compute_diff(before_uint8, after_uint8):
-    """Compute absolute pixel difference between two uint8 arrays."""
-    return cv2.absdiff(after_uint8, before_uint8)
+
+def downsample(arr, size=THUMB_SIZE):
+    """Shrink a raw array to thumbnail size with area averaging.
+
+    dtypes cv2.resize can't take (e.g. int32/uint32 GeoTIFFs) go through
+    float32 first; supported ones keep their native dtype.
+    """
+    if arr.dtype.type not in RESIZE_DTYPES:
+        arr = arr.astype("float32")
+    return cv2.resize(arr, size, interpolation=cv2.INTER_AREA)
 
 
-def threshold_mask(diff, threshold=None):
-    """Apply binary threshold and morphological cleanup to diff image."""
+def compute_diff(before_uint8, after_uint8, dst=None):
+    """Compute absolute pixel difference between two uint8 arrays.
+
+    If dst is given, the result is written into it instead of a new array.
+    """
+    return cv2.absdiff(after_uint8, before_uint8, dst=dst)
+
+
+def threshold_mask(diff, threshold=None, dst=None):
+    """Apply binary threshold and morphological cleanup to diff image.
+
+    If dst is given, every stage runs in place in that buffer.
+    """
     if threshold is None:
         threshold = CHANGE_THRESHOLD
-    _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
-    kernel = np.ones((3, 3), np.uint8)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN,  kernel)
-    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    _, mask = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY, dst=dst)
+    return clean_mask(mask)
+
+
+def clean_mask(mask):
+    """Morphological open + close (3x3 square), in place."""
+    # Equivalent to MORPH_OPEN followed by MORPH_CLOSE with a 3x3 square
+    cv2.erode(mask,  KERNEL_3, dst=mask)
+    cv2.dilate(mask, KERNEL_5, dst=mask)
+    cv2.erode(mask,  KERNEL_3, dst=mask)
     return mask
 
 
-def count_changes(mask):
-    """Return (change_pixels, total_pixels, change_pct)."""
-    change_pixels = int(np.sum(mask == 255))
-    total_pixels  = mask.size
-    change_pct    = round(change_pixels / total_pixels * 100, 2)
+def change_percent(change_pixels, total_pixels):
+    """Changed share of the image in %, rounded half-up to 2 decimals.
+
+    Exact integer arithmetic, so ties always round up: 8192 of 262144 px
+    (512x512) gives 3.13, where float round() would give 3.12.
+    """
+    return (change_pixels * 10000 + total_pixels // 2) // total_pixels / 100.0
+
+
+def count_changes(mask, total_pixels=None):
+    """Return (change_pixels, total_pixels, change_pct).
+
+    Callers that already know the image size can pass total_pixels.
+    """
+    change_pixels = cv2.countNonZero(mask)
+    if total_pixels is None:
+        total_pixels = mask.size
+    change_pct    = change_percent(change_pixels, total_pixels)
     return change_pixels, total_pixels, change_pct
 
 
-def process_arrays(before_arr, after_arr, threshold=None):
-    """End-to-end pipeline from raw float arrays to stats.
+def process_arrays(before_arr, after_arr, threshold=None, engine="opencv"):
+    """End-to-end pipeline from raw arrays to stats.
 
     Args:
-        before_arr: numpy float array of before image
-        after_arr:  numpy float array of after image
+        before_arr: numpy array of before image (any numeric dtype)
+        after_arr:  numpy array of after image (any numeric dtype)
         threshold:  int pixel diff threshold (default: from config)
+        engine:     "opencv" (default), "numba" to run the fused JIT
+                    kernels in process_change_numba.py (needs numba), or
+                    "cython" to run diff + threshold in the compiled
+                    _fused_change extension (see build_fused_change.py).
+                    "opencv" runs on the iGPU via OpenCL when available.
 
     Returns:
         dict with keys: before_n, after_n, diff, mask,
                         change_pixels, total_pixels, change_pct
     """
-    before_n = normalize_array(before_arr.astype("float32"))
-    after_n  = normalize_array(after_arr.astype("float32"))
-    diff     = compute_diff(before_n, after_n)
-    mask     = threshold_mask(diff, threshold)
-    change_pixels, total_pixels, change_pct = count_changes(mask)
+    total_pixels = before_arr.shape[0] * before_arr.shape[1]
+    if engine == "numba":
+        # Imported lazily so numba stays an optional dependency
+        from backend.process_change_numba import process_arrays_numba
+        if threshold is None:
+            threshold = CHANGE_THRESHOLD
+        before_n, after_n, diff, mask, change_pixels = process_arrays_numba(
+            as_cv_array(before_arr), as_cv_array(after_arr), threshold
+        )
+        change_pct = change_percent(change_pixels, total_pixels)
+    elif engine == "cython":
+        # Built separately (python backend/build_fused_change.py), so import lazily
+        from backend._fused_change import fused_change_u8
+        if threshold is None:
+            threshold = CHANGE_THRESHOLD
+        before_n = np.ascontiguousarray(normalize_array(before_arr))
+        after_n  = np.ascontiguousarray(normalize_array(after_arr))
+        diff     = np.empty_like(before_n)
+        mask     = np.empty_like(before_n)
+        fused_change_u8(before_n, after_n, threshold, diff, mask)
+        clean_mask(mask)
+        change_pixels, total_pixels, change_pct = count_changes(mask, total_pixels)
+    elif engine == "opencv":
+        before_n = normalize_array(before_arr)
+        after_n  = normalize_array(after_arr)
+        if _opencl_enabled():
+            # Upload the uint8 images once, keep every stage on the device
+            # and only download the final diff and mask
+            diff = compute_diff(cv2.UMat(before_n), cv2.UMat(after_n))
+            mask = threshold_mask(diff, threshold)
+            diff, mask = diff.get(), mask.get()
+        else:
+            # absdiff/threshold/morphology write in place into two per-call buffers
+            diff = compute_diff(before_n, after_n, dst=np.empty_like(before_n))
+            mask = threshold_mask(diff, threshold, dst=np.empty_like(before_n))
+        change_pixels, total_pixels, change_pct = count_changes(mask, total_pixels)
+    else:
+        raise ValueError(f"Unknown engine: {engine!r}")
+
+    return {
+        "before_n":      before_n,
+        "after_n":       after_n,
+        "diff":          diff,
+        "mask":          mask,
+        "change_pixels": change_pixels,
+        "total_pixels":  total_pixels,
+        "change_pct":    change_pct
+    }
+
+
+def process_arrays_batch(before_stack, after_stack, threshold=None):
+    """Run the OpenCV pipeline on N image pairs at once, e.g. one per AOI.
+
+    All outputs go into preallocated (N, H, W) stacks. absdiff and threshold
+    are purely per-pixel, so each runs once over the stack viewed as a single
+    (N*H, W) image. Normalization and morphology depend on each image's
+    contents or neighbours, so they run per image on views into the stacks.
+
+    Args:
+        before_stack: (N, H, W) numpy array of before images
+        after_stack:  (N, H, W) numpy array of after images
+        threshold:    int pixel diff threshold (default: from config)
+
+    Returns:
+        dict with keys: before_n, after_n, diff, mask  ((N, H, W) uint8),
+                        change_pixels, change_pct      (lists of length N),
+                        total_pixels                   (per image)
+    """
+    if threshold is None:
+        threshold = CHANGE_THRESHOLD
+    n, h, w = before_stack.shape
+    total_pixels = h * w
+
+    before_n = np.empty((n, h, w), np.uint8)
+    after_n  = np.empty((n, h, w), np.uint8)
+    diff     = np.empty((n, h, w), np.uint8)
+    mask     = np.empty((n, h, w), np.uint8)
+    for i in range(n):
+        before_n[i] = normalize_array(before_stack[i])
+        after_n[i]  = normalize_array(after_stack[i])
+
+    compute_diff(before_n.reshape(n * h, w), after_n.reshape(n * h, w),
+                 dst=diff.reshape(n * h, w))
+    cv2.threshold(diff.reshape(n * h, w), threshold, 255, cv2.THRESH_BINARY,
+                  dst=mask.reshape(n * h, w))
+
+    change_pixels = []
+    change_pct    = []
+    for i in range(n):
+        clean_mask(mask[i])
+        pixels, _, pct = count_changes(mask[i], total_pixels)
+        change_pixels.append(pixels)
+        change_pct.append(pct)
 
     return {
         "before_n":      before_n,
@@ -75,34 +260,46 @@ def process_arrays(before_arr, after_arr, threshold=None):
     }
 
 
-def process_tif_files(before_path, after_path, out_dir, threshold=None):
+def process_tif_files(before_path, after_path, out_dir, threshold=None, engine="opencv",
+                      full_res=True):
     """Process two GeoTIFF files and save output PNGs + meta.json to out_dir.
 
+    The PNGs come from running the pipeline on 512x512 downsampled inputs.
+    The stats come from a full-resolution run unless full_res is False, in
+    which case the thumbnail run's stats are used (much faster on large
+    scenes, but approximate).
+
     Args:
-        before_path (str): Path to before .tif
-        after_path  (str): Path to after  .tif
-        out_dir     (str): Directory to save outputs
-        threshold   (int): Pixel change threshold
+        before_path (str):  Path to before .tif
+        after_path  (str):  Path to after  .tif
+        out_dir     (str):  Directory to save outputs
+        threshold   (int):  Pixel change threshold
+        engine      (str):  "opencv", "numba" or "cython" (see process_arrays)
+        full_res    (bool): Compute stats at full resolution
 
     Returns:
         dict: metadata with stats
     """
+    # Imported here so callers that only need process_arrays skip GDAL's load time
+    import rasterio
+
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     with rasterio.open(before_path) as src:
-        before_arr = src.read(1).astype("float32")
+        before_arr = src.read(1)
     with rasterio.open(after_path) as src:
-        after_arr  = src.read(1).astype("float32")
+        after_arr  = src.read(1)
 
-    result = process_arrays(before_arr, after_arr, threshold)
+    # Display path: shrink first, so normalize/diff/morphology run on 512x512
+    thumbs = process_arrays(downsample(before_arr), downsample(after_arr), threshold, engine)
+    # Stats path: full resolution for an accurate change_pct
+    result = process_arrays(before_arr, after_arr, threshold, engine) if full_res else thumbs
 
-    # Save 512x512 thumbnails
-    size = (512, 512)
-    cv2.imwrite(str(out_dir / "before_thumb.png"),      cv2.resize(result["before_n"], size))
-    cv2.imwrite(str(out_dir / "after_thumb.png"),       cv2.resize(result["after_n"],  size))
-    cv2.imwrite(str(out_dir / "diff_thumb.png"),        cv2.resize(result["diff"],     size))
-    cv2.imwrite(str(out_dir / "change_mask_thumb.png"), cv2.resize(result["mask"],     size))
+    cv2.imwrite(str(out_dir / "before_thumb.png"),      thumbs["before_n"])
+    cv2.imwrite(str(out_dir / "after_thumb.png"),       thumbs["after_n"])
+    cv2.imwrite(str(out_dir / "diff_thumb.png"),        thumbs["diff"])
+    cv2.imwrite(str(out_dir / "change_mask_thumb.png"), thumbs["mask"])
 
     meta = {
         "change_pixels": result["change_pixels"],
@@ -120,9 +317,13 @@ if __name__ == "__main__":
     parser.add_argument("after",   help="Path to after  .tif")
     parser.add_argument("out_dir", help="Output directory for PNGs + meta.json")
     parser.add_argument("--threshold", type=int, default=None)
+    parser.add_argument("--engine", choices=["opencv", "numba", "cython"], default="opencv")
+    parser.add_argument("--fast", action="store_true",
+                        help="Compute stats on the 512x512 thumbnails instead of full resolution")
     args = parser.parse_args()
 
-    meta = process_tif_files(args.before, args.after, args.out_dir, args.threshold)
+    meta = process_tif_files(args.before, args.after, args.out_dir, args.threshold, args.engine,
+                             full_res=not args.fast)
     print(f"Change pixels : {meta['change_pixels']}")
     print(f"Change area % : {meta['change_pct']}%")
     print(f"Outputs saved : {args.out_dir}")
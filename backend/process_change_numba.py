@@ -0,0 +1,125 @@
+# backend/process_change_numba.py
+# Numba-compiled change detection kernels.
+# Optional backend for process_change.process_arrays(engine="numba");
+# needs the numba package, which is not in requirements.txt.
+
+import cv2
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def fused_change(before, after, lo_b, hi_b, lo_a, hi_a, thresh):
+    """Normalize, diff and threshold both images in a single pass.
+
+    Min/max of each input are precomputed by the caller, so every pixel is
+    read once and all four outputs are written in the same loop.
+
+    Returns:
+        tuple: (before_n, after_n, diff, mask) as uint8 arrays
+    """
+    h, w = before.shape
+    scale_b = 255.0 / (hi_b - lo_b) if hi_b > lo_b else 0.0
+    scale_a = 255.0 / (hi_a - lo_a) if hi_a > lo_a else 0.0
+    # Same float32 alpha/beta as cv2.convertScaleAbs in normalize_array
+    alpha_b = np.float64(np.float32(scale_b))
+    beta_b  = np.float64(np.float32(-lo_b * scale_b))
+    alpha_a = np.float64(np.float32(scale_a))
+    beta_a  = np.float64(np.float32(-lo_a * scale_a))
+    before_n = np.empty((h, w), np.uint8)
+    after_n  = np.empty((h, w), np.uint8)
+    diff     = np.empty((h, w), np.uint8)
+    mask     = np.empty((h, w), np.uint8)
+    for i in prange(h):
+        for j in range(w):
+            # Mirrors convertScaleAbs: input cast to float32, x*alpha+beta
+            # rounded once to float32, then np.rint (half to even, as cvRound)
+            b = np.uint8(np.rint(np.float32(np.float64(np.float32(before[i, j])) * alpha_b + beta_b)))
+            a = np.uint8(np.rint(np.float32(np.float64(np.float32(after[i, j]))  * alpha_a + beta_a)))
+            d = a - b if a > b else b - a
+            before_n[i, j] = b
+            after_n[i, j]  = a
+            diff[i, j]     = d
+            mask[i, j]     = 255 if d > thresh else 0
+    return before_n, after_n, diff, mask
+
+
+@njit(parallel=True, cache=True)
+def _morph_rows(src, dst, r, dilate):
+    """Horizontal 1x(2r+1) min (erode) or max (dilate) pass.
+
+    Pixels outside the image are ignored.
+    """
+    h, w = src.shape
+    for i in prange(h):
+        for j in range(w):
+            j0 = max(j - r, 0)
+            j1 = min(j + r + 1, w)
+            v = src[i, j0]
+            for x in range(j0 + 1, j1):
+                s = src[i, x]
+                if (s > v) if dilate else (s < v):
+                    v = s
+            dst[i, j] = v
+
+
+@njit(parallel=True, cache=True)
+def _morph_cols(src, dst, r, dilate):
+    """Vertical (2r+1)x1 min (erode) or max (dilate) pass.
+
+    Walks whole rows so memory access stays contiguous. Pixels outside the
+    image are ignored. Returns the number of non-zero pixels written to dst.
+    """
+    h, w = src.shape
+    count = 0
+    for i in prange(h):
+        i0 = max(i - r, 0)
+        i1 = min(i + r + 1, h)
+        row = src[i0].copy()
+        for y in range(i0 + 1, i1):
+            for j in range(w):
+                s = src[y, j]
+                if (s > row[j]) if dilate else (s < row[j]):
+                    row[j] = s
+        for j in range(w):
+            dst[i, j] = row[j]
+            if row[j] != 0:
+                count += 1
+    return count
+
+
+def clean_mask(mask):
+    """3x3 open + close, as erode(3x3) -> dilate(5x5) -> erode(3x3).
+
+    Each square pass is split into a 1-D row pass and a 1-D column pass,
+    so a (2r+1)x(2r+1) window costs 2(2r+1) reads per pixel instead of
+    (2r+1)^2. The cleaned mask is written back into mask.
+
+    Returns:
+        tuple: (mask, change_pixels)
+    """
+    tmp = np.empty_like(mask)
+    _morph_rows(mask, tmp, 1, False)
+    _morph_cols(tmp, mask, 1, False)
+    _morph_rows(mask, tmp, 2, True)
+    _morph_cols(tmp, mask, 2, True)
+    _morph_rows(mask, tmp, 1, False)
+    change_pixels = _morph_cols(tmp, mask, 1, False)
+    return mask, int(change_pixels)
+
+
+def process_arrays_numba(before_arr, after_arr, threshold):
+    """Numba equivalent of the OpenCV pipeline in process_change.
+
+    Outputs and stats match engine="opencv" bit for bit.
+
+    Returns:
+        tuple: (before_n, after_n, diff, mask, change_pixels)
+    """
+    lo_b, hi_b, _, _ = cv2.minMaxLoc(before_arr)
+    lo_a, hi_a, _, _ = cv2.minMaxLoc(after_arr)
+    before_n, after_n, diff, mask = fused_change(
+        before_arr, after_arr, lo_b, hi_b, lo_a, hi_a, threshold
+    )
+    mask, change_pixels = clean_mask(mask)
+    return before_n, after_n, diff, mask, change_pixels
@@ -19,3 +19,7 @@ CLOUD_THRESHOLD = 20
 
 # Pixel difference threshold for change detection
 CHANGE_THRESHOLD = 25
+
+# Let the OpenCV change detection run on an integrated GPU via OpenCL
+# when one is available (set False to always stay on the CPU)
+USE_OPENCL = True